@@ -0,0 +1,29 @@
+"""One-time conversion of DRED.xlsx to DRED.parquet.
+
+Run `python convert.py` whenever DRED.xlsx changes. The dashboard reads the
+Parquet file, which is much faster to load than parsing the Excel workbook.
+"""
+import pandas as pd
+
+# -------------------- DTYPES --------------------
+# Nullable dtypes keep blank cells as missing values instead of failing the parse
+DTYPES = {
+    "price": "Int64",
+    "average_rent": "Int64",
+    "year_of_completion": "Int64",
+    "price_per_sqft": "Float64",
+    "rental_yield": "Float64",
+    "days_on_market": "Int64",
+    "mortgage_score": "Int64",
+}
+
+# -------------------- CONVERT --------------------
+def convert(src="DRED.xlsx", dst="DRED.parquet"):
+    df = pd.read_excel(src, sheet_name=0, dtype=DTYPES, parse_dates=["post_date"])
+    df.to_parquet(dst, engine="pyarrow", compression="zstd", index=False)
+    return df
+
+
+if __name__ == "__main__":
+    out = convert()
+    print(f"Wrote DRED.parquet ({len(out)} rows, {out.shape[1]} columns)")
@@ -0,0 +1,258 @@
+"""Data loading, filtering and figure builders shared by the DRED dashboard."""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+import streamlit as st
+
+from convert import convert
+
+# -------------------- LOAD DATA -----------------
+# Narrowest Arrow types that hold DRED's values exactly; an out-of-range value fails the cast loudly.
+# Fractional columns stay double so the table and downloads keep the source precision.
+DOWNCAST = {
+    "price": "int32[pyarrow]",
+    "average_rent": "int32[pyarrow]",
+    "mortgage_score": "int8[pyarrow]",
+    "days_on_market": "int16[pyarrow]",
+    "beds": "int8[pyarrow]",
+    "baths": "int8[pyarrow]",
+    "elevators": "int8[pyarrow]",
+    "total_parking_spaces": "int16[pyarrow]",
+    "year_of_completion": "int16[pyarrow]",
+}
+
+def load_data():
+    # DRED.parquet is produced from DRED.xlsx by convert.py; build it on first run if missing
+    if not os.path.exists("DRED.parquet"):
+        convert()
+    # Key the disk cache on the file's mtime so re-running convert.py invalidates it; the mtime is
+    # also returned as the dataset version for callers to fold into their own cache keys
+    version = os.path.getmtime("DRED.parquet")
+    df, opts = read_data(version)
+    return df, opts, version
+
+@st.cache_data(persist="disk", show_spinner="Loading DRED…")
+def read_data(mtime):
+    df = pd.read_parquet("DRED.parquet", engine="pyarrow", dtype_backend="pyarrow").astype(DOWNCAST)
+    for c in ["area_name", "type", "furnishing", "price_category", "completion_status",
+              "purpose", "investment_grade", "hotspot_flag"]:
+        df[c] = df[c].astype("category")
+    # NumPy datetimes export to CSV as plain dates (2024-04-18); Arrow timestamps append 00:00:00
+    df["post_date"] = df["post_date"].astype("datetime64[us]")
+    # Sidebar choices and price bounds never change for a loaded dataset, so cache them alongside it
+    return df, filter_options(df)
+
+def area_aggs(filtered):
+    # One groupby pass for every per-area figure; cached through fig_market_overview
+    g = filtered.groupby('area_name', sort=False, observed=True)
+    return {'count': g.size(), 'price_mean': g['price'].mean()}
+
+def filter_options(df):
+    opts = {c: sorted(df[c].dropna().unique().tolist()) for c in ["area_name", "type", "furnishing"]}
+    opts["beds"] = sorted(df["beds"].dropna().unique().tolist())
+    opts["price_min"], opts["price_max"] = int(df["price"].min()), int(df["price"].max())
+    return opts
+
+def sample_points(frame, n=50_000):
+    # Cap the rows sent to scatter plots; WebGL struggles well before ~1M points
+    return frame if len(frame) <= n else frame.sample(n=n, random_state=0)
+
+def category_counts(series):
+    # Frequencies of the categories present in the current selection
+    vc = series.value_counts()
+    return vc[vc > 0]
+
+# -------------------- FILTERS --------------------
+def build_filter_mask(df, filters):
+    # filters is the sidebar tuple (area, type, furnishing, price_range, beds); one AND-reduced mask
+    area, type_, furnishing, price_range, selected_beds = filters
+    mask = np.ones(len(df), dtype=bool)
+    # Nullable columns give <NA> comparisons; treat those rows as not matching
+    if area: mask &= df['area_name'].isin(area).to_numpy(dtype=bool, na_value=False)
+    if type_: mask &= df['type'].isin(type_).to_numpy(dtype=bool, na_value=False)
+    if furnishing: mask &= df['furnishing'].isin(furnishing).to_numpy(dtype=bool, na_value=False)
+    mask &= df['price'].between(price_range[0], price_range[1]).to_numpy(dtype=bool, na_value=False)
+    mask &= df['beds'].isin(selected_beds).to_numpy(dtype=bool, na_value=False)
+    return mask
+
+# -------------------- FIGURES --------------------
+# Figure builders are cached on the filter key (dataset version + sidebar filters); the frame is not hashed.
+def binned_bars(frame, col, color, bins, title, xlabel=None, palette=None):
+    # Histogram binned in numpy, stacked by `color`; sends one bar per bin instead of every value.
+    # bins=None treats `col` as small non-negative integers and counts them with np.bincount.
+    vals = frame[col].to_numpy(dtype=float, na_value=np.nan)
+    groups = frame[color].to_numpy()
+    keep = ~np.isnan(vals)
+    vals, groups = vals[keep], groups[keep]
+    labels = pd.unique(groups)
+    if bins is None:
+        vals = vals.astype(int)
+        x = np.arange(vals.max() + 1 if len(vals) else 0)
+        width = None
+        counts = [np.bincount(vals[groups == g], minlength=len(x)) for g in labels]
+    else:
+        edges = np.histogram_bin_edges(vals, bins=bins)
+        x = (edges[:-1] + edges[1:]) / 2
+        width = np.diff(edges)
+        counts = [np.histogram(vals[groups == g], bins=edges)[0] for g in labels]
+    palette = palette or px.colors.qualitative.Plotly
+    fig = go.Figure([
+        go.Bar(x=x, y=y, width=width, name=str(g), marker_color=palette[i % len(palette)])
+        for i, (g, y) in enumerate(zip(labels, counts))
+    ])
+    fig.update_layout(barmode="stack", bargap=0 if bins else 0.1, title=title,
+                      xaxis_title=xlabel or col, yaxis_title="count", legend_title_text=color)
+    return fig
+
+def area_bars(series, title, ylabel, colorscale):
+    # Top-15 areas as bars shaded by value, without a colour bar so it can sit in a subplot grid
+    top = series.sort_values(ascending=False).head(15)
+    fig = go.Figure(go.Bar(x=top.index.astype(str), y=top.to_numpy(), showlegend=False,
+                           marker=dict(color=top.to_numpy(), colorscale=colorscale)))
+    fig.update_layout(title=title, xaxis_title="Area", yaxis_title=ylabel)
+    return fig
+
+def subplot_grid(figs, cols, **layout):
+    # Merge several figures into one so the page ships a single Plotly chart per group
+    rows = -(-len(figs) // cols)
+    grid = make_subplots(rows=rows, cols=cols, subplot_titles=[f.layout.title.text for f in figs])
+    seen = set()
+    legends = {}  # source legend title -> legend id in the grid ("legend", "legend2", ...)
+    for i, f in enumerate(figs):
+        row, col = i // cols + 1, i % cols + 1
+        title = f.layout.legend.title.text
+        for trace in f.data:
+            if trace.showlegend is not False:
+                # Each source legend title gets its own legend; same-named traces in it share one entry
+                ref = legends.setdefault(title, f"legend{len(legends) + 1}" if legends else "legend")
+                trace.update(legend=ref, legendgroup=f"{title}:{trace.name}",
+                             showlegend=(title, trace.name) not in seen)
+                seen.add((title, trace.name))
+            grid.add_trace(trace, row=row, col=col)
+        grid.update_xaxes(title_text=f.layout.xaxis.title.text, row=row, col=col)
+        grid.update_yaxes(title_text=f.layout.yaxis.title.text, row=row, col=col)
+    for k, (title, ref) in enumerate(legends.items()):
+        grid.update_layout({ref: dict(title_text=title, x=1.02, xanchor="left", y=1 - 0.25 * k, yanchor="top")})
+    grid.update_layout(barmode="stack", bargap=0.1, **layout)
+    return grid
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fig_market_overview(filter_key, _filtered):
+    aggs = area_aggs(_filtered)
+    return subplot_grid([
+        binned_bars(_filtered, "price", "price_category", 40, "Price Distribution by Category",
+                    xlabel="Price (AED)", palette=px.colors.sequential.Blues),
+        binned_bars(_filtered, "rental_yield", "type", 30, "Rental Yield Distribution by Type",
+                    xlabel="Rental Yield (%)", palette=px.colors.sequential.Tealgrn),
+        area_bars(aggs['count'], "Listings by Area", "Listings", "Blues"),
+        area_bars(aggs['price_mean'], "Average Price by Area", "Avg Price (AED)", "Teal"),
+    ], cols=2, height=900)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fig_pie(filter_key, _filtered, col, title, hole=None):
+    vc = category_counts(_filtered[col])
+    return px.pie(values=vc.values, names=vc.index, title=title, hole=hole)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fig_sqft_yield(filter_key, _filtered):
+    return px.scatter(sample_points(_filtered), x="price_per_sqft", y="rental_yield", color="type",
+                      hover_data=["area_name", "price"],
+                      title="Price per Sqft vs Rental Yield", render_mode="webgl")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fig_mortgage_box(filter_key, _filtered):
+    return px.box(_filtered, x="price_category", y="mortgage_score", color="price_category",
+                  points="all", title="Mortgage Score by Price Category")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fig_completion_trend(filter_key, _filtered):
+    year_counts = _filtered['year_of_completion'].dropna().astype(int).value_counts().sort_index()
+    return px.line(x=year_counts.index, y=year_counts.values,
+                   labels={'x':'Year of Completion', 'y':'Listings'},
+                   title="Trend of New Properties")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fig_furnishing(filter_key, _filtered):
+    return px.bar(category_counts(_filtered["furnishing"]), text_auto=True, title="Furnishing Status")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fig_rooms_hist(filter_key, _filtered):
+    return subplot_grid([
+        binned_bars(_filtered, "beds", "type", None, "Bedrooms Distribution"),
+        binned_bars(_filtered, "baths", "type", None, "Bathrooms Distribution"),
+    ], cols=2)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fig_parking_price(filter_key, _filtered):
+    return px.scatter(sample_points(_filtered), x="total_parking_spaces", y="price", color='type',
+                      title="Parking Spaces vs. Price", labels={'total_parking_spaces':'Parking Spaces'},
+                      render_mode="webgl")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fig_elevators_price(filter_key, _filtered):
+    apt_df = _filtered[_filtered['type'] == "Apartment"]
+    return px.scatter(sample_points(apt_df), x="elevators", y="price", title="Elevators vs Price (Apartments)",
+                      render_mode="webgl")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fig_days_box(filter_key, _filtered):
+    return px.box(_filtered, x="type", y="days_on_market", points="outliers", title="Days on Market by Type")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def map_points(filter_key, _filtered):
+    # st.map only reads the coordinates, so don't ship the other columns
+    return _filtered[['Latitude', 'Longitude']].dropna()
+
+# -------------------- TABLES --------------------
+# Colour stops of matplotlib's "Greens" colormap, light to dark
+GREENS = np.array([[int(h[i:i + 2], 16) for i in (0, 2, 4)] for h in [
+    "f7fcf5", "e5f5e0", "c7e9c0", "a1d99b", "74c476", "41ab5d", "238b45", "006d2c", "00441b"]])
+
+def gradient_css(table):
+    # Per-column background shading like Styler.background_gradient, computed with numpy
+    vals = table.to_numpy(dtype=float)
+    if vals.size:
+        lo, hi = vals.min(axis=0), vals.max(axis=0)
+        norm = (vals - lo) / np.where(hi > lo, hi - lo, 1)
+    else:
+        norm = vals
+    stops = np.linspace(0, 1, len(GREENS))
+    rgb = np.rint(np.stack([np.interp(norm, stops, GREENS[:, c]) for c in range(3)], axis=-1)).astype(int)
+    css = [[f"background-color: #{r:02x}{g:02x}{b:02x}; color: {'#f1f1f1' if n > 0.6 else '#000000'}"
+            for (r, g, b), n in zip(row_rgb, row_norm)] for row_rgb, row_norm in zip(rgb, norm)]
+    return pd.DataFrame(css, index=table.index, columns=table.columns)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def grade_by_area(filter_key, _filtered):
+    grade_area = pd.crosstab(_filtered['area_name'], _filtered['investment_grade'])
+    return grade_area, gradient_css(grade_area)
+
+# -------------------- EXPORTS --------------------
+@st.cache_data(max_entries=8, show_spinner=False)
+def to_csv_bytes(filter_key, _filtered):
+    buf = io.BytesIO()
+    _filtered.to_csv(buf, index=False)
+    return buf.getvalue()
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def to_parquet_bytes(filter_key, _filtered):
+    buf = io.BytesIO()
+    _filtered.to_parquet(buf, engine="pyarrow", compression="zstd", index=False)
+    return buf.getvalue()
+
+# -------------------- DIAGNOSTICS --------------------
+def cache_stats():
+    # Memory held by each st.cache_data function; Streamlit does not expose hit/miss counters.
+    # The stats provider is internal Streamlit API, so a missing one only disables this panel.
+    try:
+        from streamlit.runtime.caching import get_data_cache_stats_provider
+    except ImportError:
+        return None
+    stats = [stat for family in get_data_cache_stats_provider().get_stats().values() for stat in family]
+    table = pd.DataFrame([(stat.cache_name, stat.byte_length) for stat in stats], columns=["function", "bytes"])
+    return table.groupby("function").sum().sort_values("bytes", ascending=False)